@@ -4,264 +4,289 @@
 # S type and outputting code done by 2024516
 # dictionaries and class done by 2024244
 
-import re
+import os
 import sys
-import pandas as pd
 
-# Instruction set dictionary 
+# Instruction set dictionary: (opcode, funct3, funct7) as integers
 instr_set = {
-    "jal":   ("1101111", None, None),
-    "lui":   ("0110111", None, None),
-    "auipc": ("0010111", None, None),
-    "beq":   ("1100011", "000", None),
-    "bne":   ("1100011", "001", None),
-    "blt":   ("1100011", "100", None),
-    "bge":   ("1100011", "101", None),
-    "bltu":  ("1100011", "110", None),
-    "bgeu":  ("1100011", "111", None),
-    "sw":    ("0100011", "010", None),
-    "lw":    ("0000011", "010", None),
-    "addi":  ("0010011", "000", None),
-    "sltiu": ("0010011", "011", None),
-    "jalr":  ("1100111", "000", None),
-    "add":   ("0110011", "000", "0000000"),
-    "sub":   ("0110011", "000", "0100000"),
-    "sll":   ("0110011", "001", "0000000"),
-    "slt":   ("0110011", "010", "0000000"),
-    "sltu":  ("0110011", "011", "0000000"),
-    "xor":   ("0110011", "100", "0000000"),
-    "srl":   ("0110011", "101", "0000000"),
-    "or":    ("0110011", "110", "0000000"),
-    "and":   ("0110011", "111", "0000000")
+    "jal":   (0b1101111, None, None),
+    "lui":   (0b0110111, None, None),
+    "auipc": (0b0010111, None, None),
+    "beq":   (0b1100011, 0b000, None),
+    "bne":   (0b1100011, 0b001, None),
+    "blt":   (0b1100011, 0b100, None),
+    "bge":   (0b1100011, 0b101, None),
+    "bltu":  (0b1100011, 0b110, None),
+    "bgeu":  (0b1100011, 0b111, None),
+    "sw":    (0b0100011, 0b010, None),
+    "lw":    (0b0000011, 0b010, None),
+    "addi":  (0b0010011, 0b000, None),
+    "sltiu": (0b0010011, 0b011, None),
+    "jalr":  (0b1100111, 0b000, None),
+    "add":   (0b0110011, 0b000, 0b0000000),
+    "sub":   (0b0110011, 0b000, 0b0100000),
+    "sll":   (0b0110011, 0b001, 0b0000000),
+    "slt":   (0b0110011, 0b010, 0b0000000),
+    "sltu":  (0b0110011, 0b011, 0b0000000),
+    "xor":   (0b0110011, 0b100, 0b0000000),
+    "srl":   (0b0110011, 0b101, 0b0000000),
+    "or":    (0b0110011, 0b110, 0b0000000),
+    "and":   (0b0110011, 0b111, 0b0000000)
 }
 
-# Register mapping (using binary string representations)
-reg_bin = {
-    "zero": "00000", "ra": "00001", "sp": "00010", "gp": "00011", "tp": "00100",
-    "t0": "00101", "t1": "00110", "t2": "00111", "s0": "01000", "s1": "01001",
-    "a0": "01010", "a1": "01011", "a2": "01100", "a3": "01101", "a4": "01110",
-    "a5": "01111", "a6": "10000", "a7": "10001", "s2": "10010", "s3": "10011",
-    "s4": "10100", "s5": "10101", "s6": "10110", "s7": "10111", "s8": "11000",
-    "s9": "11001", "s10": "11010", "s11": "11011", "t3": "11100", "t4": "11101",
-    "t5": "11110", "t6": "11111"
+# Constant part of each instruction word (funct7 | funct3 | opcode), pre-shifted at import
+instr_base = {
+    name: ((funct7 or 0) << 25) | ((funct3 or 0) << 12) | opcode
+    for name, (opcode, funct3, funct7) in instr_set.items()
 }
 
+# Register mapping (ABI name -> register number)
+registers = {
+    "zero": 0, "ra": 1, "sp": 2, "gp": 3, "tp": 4,
+    "t0": 5, "t1": 6, "t2": 7, "s0": 8, "s1": 9,
+    "a0": 10, "a1": 11, "a2": 12, "a3": 13, "a4": 14,
+    "a5": 15, "a6": 16, "a7": 17, "s2": 18, "s3": 19,
+    "s4": 20, "s5": 21, "s6": 22, "s7": 23, "s8": 24,
+    "s9": 25, "s10": 26, "s11": 27, "t3": 28, "t4": 29,
+    "t5": 30, "t6": 31
+}
+
+# Operand index of the PC-relative target for jal and branches
+target_pos = {"jal": 1, "beq": 2, "bne": 2, "blt": 2, "bge": 2, "bltu": 2, "bgeu": 2}
+
+class AsmError(ValueError):
+    # Raised for any problem in the source program; the CLI reports it and exits
+    pass
+
 class RVAssembler:
-    def __init__(self, filename):
+    def __init__(self, filename, debug=False):
         # Read all non-empty lines from the input file
         try:
             with open(filename, "r") as f:
                 self.raw_lines = [line.strip() for line in f if line.strip()]
         except Exception as e:
-            sys.exit(f"Error reading file: {e}")
+            raise AsmError(f"Error reading file: {e}")
         
-        # Process labels and instructions 
+        # Single pass: record labels and break instructions into opcode and argument parts
         self.labels = {}
-        self.instr_lines = []  # Instructions after label removal
+        self.asm_parts = []
         current_addr = 0
         for idx, line in enumerate(self.raw_lines):
-            if ':' in line:
+            label, sep, remainder = line.partition(":")
+            if sep:
                 # Split into label and (optional) instruction part
-                label_part, remainder = line.split(":", 1)
-                label = label_part.strip()
+                label = label.strip()
                 if not label or not label[0].isalpha():
-                    sys.exit(f"Invalid label format at line {idx+1}")
+                    raise AsmError(f"Invalid label format at line {idx+1}")
                 self.labels[label] = current_addr
-                if remainder.strip():
-                    self.instr_lines.append(remainder.strip())
-                    current_addr += 4
-            else:
-                self.instr_lines.append(line)
-                current_addr += 4
-        
-        if not self.instr_lines:
-            sys.exit("No instructions found in the source file.")
-        
-        # Break instructions into opcode and argument parts
-        self.asm_parts = []
-        for line in self.instr_lines:
+                line = remainder.strip()
+                if not line:
+                    continue
             parts = line.split(None, 1)
             if len(parts) < 2:
-                sys.exit(f"Invalid instruction format: {line}")
+                raise AsmError(f"Invalid instruction format: {line}")
             self.asm_parts.append(parts)
+            current_addr += 4
+        
+        if not self.asm_parts:
+            raise AsmError("No instructions found in the source file.")
         
-        # Debug: Display instructions using a DataFrame 
-        df = pd.DataFrame(self.asm_parts, columns=["opcode", "args"])
-        print(df)
+        # Debug: Display the parsed instructions as a table, printed in one call
+        if debug:
+            rows = [f"{'':>4} {'opcode':<6} args"]
+            rows += [f"{idx:>4} {op:<6} {args}" for idx, (op, args) in enumerate(self.asm_parts)]
+            print("\n".join(rows))
         
         # Enforce that the last instruction is the virtual halt: "beq zero,zero,0"
+        # Only the final instruction is inspected (O(1)); whitespace in its operands is ignored
+        # by the same rule the tokenizer's str.split() uses
         last_op, last_args = self.asm_parts[-1]
-        if last_op != "beq":
-            sys.exit("Error: Last instruction must be 'beq zero,zero,0'")
-        # Remove all spaces and check
-        if "".join(last_args.split()) != "zero,zero,0":
-            sys.exit("Error: Last instruction must be 'beq zero,zero,0'")
+        if last_op != "beq" or "".join(last_args.split()) != "zero,zero,0":
+            raise AsmError("Error: Last instruction must be 'beq zero,zero,0'")
+
+        # Second pass: with every label address known, tokenize each instruction once and
+        # pre-resolve jal/branch label targets so encoding never consults the label table
+        self.asm_args = [self.tokenize(parts, 4 * idx) for idx, parts in enumerate(self.asm_parts)]
+
+    def tokenize(self, parts, curr_addr):
+        # Split the argument string on commas, and on parentheses only when present
+        operands = parts[1].replace(",", " ")
+        if "(" in operands:
+            operands = operands.replace("(", " ").replace(")", " ")
+        args = operands.split()
+        # A jal/branch target given as a label becomes its offset from this instruction
+        pos = target_pos.get(parts[0])
+        if pos is not None and len(args) == pos + 1:
+            target = self.labels.get(args[pos])
+            if target is not None:
+                args[pos] = target - curr_addr
+        return args
 
-    def to_binary(self, n, bits):
-        # Return two's complement binary representation of n with the given number of bits.
-        if n < 0:
-            n = (1 << bits) + n
-        if n < 0 or n >= (1 << bits):
-            sys.exit(f"Immediate {n} out of range for {bits} bits")
-        return format(n, f'0{bits}b')
+    def to_unsigned(self, n, bits):
+        # Return the two's complement value of n as an unsigned field of the given number of bits.
+        if n < -(1 << bits) or n >= (1 << bits):
+            raise AsmError(f"Immediate {n} out of range for {bits} bits")
+        return n & ((1 << bits) - 1)
+
+    def resolve_imm(self, tok, curr_addr):
+        # Integer literal, or a label turned into an offset from the current instruction
+        try:
+            return int(tok)
+        except ValueError:
+            target = self.labels.get(tok)
+            if target is None:
+                raise AsmError(f"Invalid immediate/label '{tok}' at address {curr_addr}")
+            return target - curr_addr
+
+    def encode_instruction(self, parts, curr_addr, args=None):
+        # Encode one instruction into its 32-bit word (as an int); args are the
+        # pre-tokenized operands when available
+        opcode = parts[0]
+        try:
+            handler, base, nargs = DISPATCH[opcode]
+        except KeyError:
+            raise AsmError(f"Unknown instruction '{opcode}' at address {curr_addr}") from None
+        if args is None:
+            args = self.tokenize(parts, curr_addr)
+        # Operand count is validated here once for every form; handlers assume it
+        if len(args) != nargs:
+            raise AsmError(f"Invalid number of arguments for {opcode} at address {curr_addr}")
+        return handler(self, parts, args, base, curr_addr)
 
     def assemble_instruction(self, parts, curr_addr):
+        return format(self.encode_instruction(parts, curr_addr), '032b')
+
+    # J-type: jal
+    def _emit_jal(self, parts, args, base, curr_addr):
+        try:
+            rd = registers[args[0]]
+        except KeyError:
+            raise AsmError(f"Invalid register {args[0]} at address {curr_addr}") from None
+        imm_val = self.resolve_imm(args[1], curr_addr)
+        if imm_val >= 2**20 or imm_val < -2**20:
+            raise AsmError(f"Immediate value out of range for jal at address {curr_addr}")
+        # Rearrangement: imm[20] | imm[10:1] | imm[11] | imm[19:12], each field masked in
+        # place and moved with one shift (masking a negative int yields its two's complement bits)
+        return ((imm_val & 0x100000) << 11 | (imm_val & 0x7FE) << 20 | (imm_val & 0x800) << 9
+                | (imm_val & 0xFF000) | rd << 7 | base)
+
+    # Shared operand parsing for lw/sw: "reg, offset(rs1)"
+    def _mem_operands(self, parts, args, curr_addr):
         opcode = parts[0]
-        if opcode not in instr_set:
-            sys.exit(f"Unknown instruction '{opcode}' at address {curr_addr}")
-        op_info = instr_set[opcode]
-        # Split the argument string using commas and parentheses
-        args = [arg.strip() for arg in re.split(r'[,\(\)]', parts[1]) if arg.strip()]
-        
-        # J-type: jal
-        if opcode == "jal":
-            if len(args) != 2:
-                sys.exit(f"Invalid number of arguments for jal at address {curr_addr}")
-            rd = reg_bin.get(args[0])
-            if rd is None:
-                sys.exit(f"Invalid register {args[0]} at address {curr_addr}")
-            try:
-                imm_val = int(args[1])
-            except ValueError:
-                if args[1] in self.labels:
-                    imm_val = self.labels[args[1]] - curr_addr
-                else:
-                    sys.exit(f"Invalid immediate/label '{args[1]}' at address {curr_addr}")
-            if imm_val >= 2**20 or imm_val < -2**20:
-                sys.exit(f"Immediate value out of range for jal at address {curr_addr}")
-            imm = '{:021b}'.format(imm_val if imm_val >= 0 else (2**21 + imm_val))
-            # Rearrangement: imm[20] | imm[10:1] | imm[11] | imm[19:12]
-            return imm[0] + imm[10:20] + imm[9] + imm[1:9] + rd + op_info[0]
-        
-        # I-type instructions: lw, jalr, addi
-        elif opcode in ["lw", "jalr", "addi"]:
-            if opcode == "lw":
-                if len(args) != 2:
-                    sys.exit(f"Invalid number of arguments for lw at address {curr_addr}")
-                rd = reg_bin.get(args[0])
-                # Expect format like offset(reg)
-                match = re.match(r"(-?\w+)\((\w+)\)", parts[1].split(",")[1].strip())
-                if not match:
-                    sys.exit(f"Invalid lw format at address {curr_addr}")
-                imm_str, rs1_str = match.groups()
-                try:
-                    imm_val = int(imm_str)
-                except ValueError:
-                    if imm_str in self.labels:
-                        imm_val = self.labels[imm_str] - curr_addr
-                    else:
-                        sys.exit(f"Invalid immediate/label '{imm_str}' at address {curr_addr}")
-                rs1 = reg_bin.get(rs1_str)
-                if rd is None or rs1 is None:
-                    sys.exit(f"Invalid register in lw at address {curr_addr}")
-                return self.to_binary(imm_val, 12) + rs1 + op_info[1] + rd + op_info[0]
-            elif opcode == "jalr":
-                if len(args) != 3:
-                    sys.exit(f"Invalid number of arguments for jalr at address {curr_addr}")
-                rd = reg_bin.get(args[0])
-                rs1 = reg_bin.get(args[1])
-                try:
-                    imm_val = int(args[2])
-                except ValueError:
-                    if args[2] in self.labels:
-                        imm_val = self.labels[args[2]] - curr_addr
-                    else:
-                        sys.exit(f"Invalid immediate/label '{args[2]}' at address {curr_addr}")
-                if rd is None or rs1 is None:
-                    sys.exit(f"Invalid register in jalr at address {curr_addr}")
-                return self.to_binary(imm_val, 12) + rs1 + op_info[1] + rd + op_info[0]
-            else:  # addi
-                if len(args) != 3:
-                    sys.exit(f"Invalid number of arguments for addi at address {curr_addr}")
-                rd = reg_bin.get(args[0])
-                rs1 = reg_bin.get(args[1])
-                try:
-                    imm_val = int(args[2])
-                except ValueError:
-                    if args[2] in self.labels:
-                        imm_val = self.labels[args[2]] - curr_addr
-                    else:
-                        sys.exit(f"Invalid immediate/label '{args[2]}' at address {curr_addr}")
-                if rd is None or rs1 is None:
-                    sys.exit(f"Invalid register in addi at address {curr_addr}")
-                return self.to_binary(imm_val, 12) + rs1 + op_info[1] + rd + op_info[0]
-        
-        # B-type instructions: beq, bne, blt, etc.
-        elif opcode in ["beq", "bne", "blt", "bge", "bltu", "bgeu"]:
-            if len(args) != 3:
-                sys.exit(f"Invalid number of arguments for {opcode} at address {curr_addr}")
-            rs1 = reg_bin.get(args[0])
-            rs2 = reg_bin.get(args[1])
-            try:
-                imm_val = int(args[2])
-            except ValueError:
-                if args[2] in self.labels:
-                    imm_val = self.labels[args[2]] - curr_addr
-                else:
-                    sys.exit(f"Invalid immediate/label '{args[2]}' at address {curr_addr}")
-            if rs1 is None or rs2 is None:
-                sys.exit(f"Invalid register in {opcode} at address {curr_addr}")
-            if imm_val >= 2**12 or imm_val < -2**12:
-                sys.exit(f"Immediate out of range for {opcode} at address {curr_addr}")
-            imm = '{:013b}'.format(imm_val if imm_val >= 0 else (2**13 + imm_val))
-            # Branch format: imm[12] | imm[10:5] | rs2 | rs1 | funct3 | imm[4:1] | imm[11] | opcode
-            return imm[0] + imm[2:8] + rs2 + rs1 + op_info[1] + imm[8:12] + imm[1] + op_info[0]
-        
-        # S-type: sw
-        elif opcode == "sw":
-            if len(args) != 2:
-                sys.exit(f"Invalid number of arguments for sw at address {curr_addr}")
-            rs2 = reg_bin.get(args[0])
-            match = re.match(r"(-?\w+)\((\w+)\)", parts[1].split(",")[1].strip())
-            if not match:
-                sys.exit(f"Invalid sw format at address {curr_addr}")
-            imm_str, rs1_str = match.groups()
-            try:
-                imm_val = int(imm_str)
-            except ValueError:
-                if imm_str in self.labels:
-                    imm_val = self.labels[imm_str] - curr_addr
-                else:
-                    sys.exit(f"Invalid immediate/label '{imm_str}' at address {curr_addr}")
-            rs1 = reg_bin.get(rs1_str)
-            if rs1 is None or rs2 is None:
-                sys.exit(f"Invalid register in sw at address {curr_addr}")
-            imm_bin = '{:012b}'.format(imm_val if imm_val >= 0 else (2**12 + imm_val))
-            return imm_bin[:7] + rs2 + rs1 + op_info[1] + imm_bin[7:] + op_info[0]
-        
-        # R-type instructions: add, sub, sll, etc.
-        elif opcode in ["add", "sub", "sll", "slt", "sltu", "xor", "srl", "or", "and"]:
-            if len(args) != 3:
-                sys.exit(f"Invalid number of arguments for {opcode} at address {curr_addr}")
-            rd = reg_bin.get(args[0])
-            rs1 = reg_bin.get(args[1])
-            rs2 = reg_bin.get(args[2])
-            if rd is None or rs1 is None or rs2 is None:
-                sys.exit(f"Invalid register in {opcode} at address {curr_addr}")
-            return op_info[2] + rs2 + rs1 + op_info[1] + rd + op_info[0]
-        else:
-            sys.exit(f"Unknown instruction '{opcode}' at address {curr_addr}")
+        # "reg, offset(rs1)" tokenizes to [reg, offset, rs1]
+        reg_str, imm_str, rs1_str = args
+        # Expect format like offset(reg): ignoring whitespace, the operands must read exactly
+        # "reg,offset(rs1)" (checked by rebuilding the string, no regex needed)
+        if "".join(parts[1].split()) != f"{reg_str},{imm_str}({rs1_str})":
+            raise AsmError(f"Invalid {opcode} format at address {curr_addr}")
+        imm_val = self.resolve_imm(imm_str, curr_addr)
+        try:
+            reg = registers[reg_str]
+            rs1 = registers[rs1_str]
+        except KeyError:
+            raise AsmError(f"Invalid register in {opcode} at address {curr_addr}") from None
+        # Range-checked after register validation, so a bad register is reported first
+        return reg, self.to_unsigned(imm_val, 12), rs1
+
+    # I-type: lw
+    def _emit_lw(self, parts, args, base, curr_addr):
+        rd, imm, rs1 = self._mem_operands(parts, args, curr_addr)
+        return imm << 20 | rs1 << 15 | rd << 7 | base
+
+    # I-type: jalr, addi (rd, rs1, imm)
+    def _emit_itype(self, parts, args, base, curr_addr):
+        opcode = parts[0]
+        imm_val = self.resolve_imm(args[2], curr_addr)
+        try:
+            rd = registers[args[0]]
+            rs1 = registers[args[1]]
+        except KeyError:
+            raise AsmError(f"Invalid register in {opcode} at address {curr_addr}") from None
+        return self.to_unsigned(imm_val, 12) << 20 | rs1 << 15 | rd << 7 | base
+
+    # B-type instructions: beq, bne, blt, etc.
+    def _emit_btype(self, parts, args, base, curr_addr):
+        opcode = parts[0]
+        imm_val = self.resolve_imm(args[2], curr_addr)
+        try:
+            rs1 = registers[args[0]]
+            rs2 = registers[args[1]]
+        except KeyError:
+            raise AsmError(f"Invalid register in {opcode} at address {curr_addr}") from None
+        if imm_val >= 2**12 or imm_val < -2**12:
+            raise AsmError(f"Immediate out of range for {opcode} at address {curr_addr}")
+        # Branch format: imm[12] | imm[10:5] | rs2 | rs1 | funct3 | imm[4:1] | imm[11] | opcode
+        return ((imm_val & 0x1000) << 19 | (imm_val & 0x7E0) << 20 | rs2 << 20 | rs1 << 15
+                | (imm_val & 0x1E) << 7 | (imm_val & 0x800) >> 4 | base)
+
+    # S-type: sw
+    def _emit_sw(self, parts, args, base, curr_addr):
+        rs2, imm, rs1 = self._mem_operands(parts, args, curr_addr)
+        # Store format: imm[11:5] | rs2 | rs1 | funct3 | imm[4:0] | opcode
+        return (imm >> 5) << 25 | rs2 << 20 | rs1 << 15 | (imm & 0x1F) << 7 | base
+
+    # R-type instructions: add, sub, sll, etc.
+    def _emit_rtype(self, parts, args, base, curr_addr):
+        opcode = parts[0]
+        try:
+            rd = registers[args[0]]
+            rs1 = registers[args[1]]
+            rs2 = registers[args[2]]
+        except KeyError:
+            raise AsmError(f"Invalid register in {opcode} at address {curr_addr}") from None
+        return base | rs2 << 20 | rs1 << 15 | rd << 7
+
+    def iter_words(self):
+        # Lazily encode the program to integer words; instruction i sits at address 4*i
+        encode = self.encode_instruction
+        return (encode(parts, 4 * idx, args)
+                for idx, (parts, args) in enumerate(zip(self.asm_parts, self.asm_args)))
 
     def assemble(self):
-        machine_codes = []
-        curr_addr = 0
-        for part in self.asm_parts:
-            code = self.assemble_instruction(part, curr_addr)
-            machine_codes.append(code)
-            curr_addr += 4
-        return machine_codes
+        return [format(word, '032b') for word in self.iter_words()]
 
     def write_output(self, out_filename):
-        codes = self.assemble()
+        # One join over the formatted words, encoded to bytes once and written in one call
+        data = ("\n".join(map("{:032b}".format, self.iter_words())) + "\n").encode("ascii")
         try:
-            with open(out_filename, "w") as f:
-                for code in codes:
-                    f.write(code + "\n")
+            with open(out_filename, "wb") as f:
+                f.write(data)
         except Exception as e:
-            sys.exit(f"Error writing output file: {e}")
+            raise AsmError(f"Error writing output file: {e}")
+
+# Opcode -> (encoder, operand token count)
+HANDLERS = {
+    "jal": (RVAssembler._emit_jal, 2),
+    "lw": (RVAssembler._emit_lw, 3),
+    "jalr": (RVAssembler._emit_itype, 3),
+    "addi": (RVAssembler._emit_itype, 3),
+    "sw": (RVAssembler._emit_sw, 3),
+}
+for _op in ("beq", "bne", "blt", "bge", "bltu", "bgeu"):
+    HANDLERS[_op] = (RVAssembler._emit_btype, 3)
+for _op in ("add", "sub", "sll", "slt", "sltu", "xor", "srl", "or", "and"):
+    HANDLERS[_op] = (RVAssembler._emit_rtype, 3)
+
+# Opcode -> (encoder, constant instruction bits, operand count), so one lookup yields all three
+DISPATCH = {op: (handler, instr_base[op], nargs) for op, (handler, nargs) in HANDLERS.items()}
+
+def assemble_file(in_filename, out_filename, debug=False):
+    # Assemble one source file to one output file; raises AsmError on bad input
+    RVAssembler(in_filename, debug).write_output(out_filename)
+
+def main(argv):
+    args = list(argv)
+    # The instruction table is printed only on request: --debug or ASM_DEBUG=1
+    debug = "--debug" in args
+    if debug:
+        args.remove("--debug")
+    debug = debug or os.environ.get("ASM_DEBUG", "") not in ("", "0")
+    if len(args) != 2:
+        sys.exit("Usage: rv_assembler.py [--debug] <input_file> <output_file>")
+    try:
+        assemble_file(args[0], args[1], debug)
+    except AsmError as e:
+        sys.exit(str(e))
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        sys.exit("Usage: rv_assembler.py <input_file> <output_file>")
-    assembler = RVAssembler(sys.argv[1])
-    assembler.write_output(sys.argv[2])
+    main(sys.argv[1:])